@@ -1,41 +1,164 @@
+import os
 import sys
+import time
+from collections import deque
+import numpy as np
 
-def part_one():
-    file_name = sys.argv[1]
+SAMPLE_FILE = './sample_input.txt'
 
+def test_count_increases():
+    assert count_increases(read_measurements(SAMPLE_FILE), window_sizes=(1, 3)) == {1: 5, 3: 5}
+
+def test_count_increases_large_window():
+    assert count_increases(iter([1, 2, 3, 4, 5]), window_sizes=(4, 5)) == {4: 1, 5: 0}
+
+def test_count_increases_bulk():
+    measurements = np.fromfile(SAMPLE_FILE, dtype=np.int64, sep='\n')
+    assert count_increases_bulk(measurements, window_sizes=(1, 3)) == {1: 5, 3: 5}
+
+def test_follow_lines(tmp_path):
+    log = tmp_path / 'sonar.txt'
+    log.write_text('199\n200\n20')
+    counter = DepthIncreaseCounter()
+    updates = follow_lines(log, poll_interval=0)
+    assert counter.add_all(int(line) for line in next(updates)) == {1: 1, 3: 0}
+    with open(log, 'a') as f:
+        f.write('8\n210\n')
+    assert counter.add_all(int(line) for line in next(updates)) == {1: 3, 3: 1}
+
+def test_load_measurements_without_cache_write(tmp_path, monkeypatch):
+    log = tmp_path / 'sonar.txt'
+    log.write_text('199\n200\n208\n')
+
+    def read_only_save(*args, **kwargs):
+        raise PermissionError('read-only directory')
+    monkeypatch.setattr(np, 'save', read_only_save)
+    assert list(load_measurements(str(log), cache=True)) == [199, 200, 208]
+
+def test_load_measurements_cache(tmp_path):
+    log = tmp_path / 'sonar.txt'
+    log.write_text('199\n200\n')
+    assert list(load_measurements(str(log), cache=True)) == [199, 200]
+    cached = load_measurements(str(log), cache=True)
+    assert isinstance(cached, np.memmap) and list(cached) == [199, 200]
+    # an append within the same timestamp still changes the size
+    stat = os.stat(log)
+    with open(log, 'a') as f:
+        f.write('208\n')
+    os.utime(log, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert list(load_measurements(str(log), cache=True)) == [199, 200, 208]
+
+def read_measurements(file_name):
+    '''Lazily yield depth measurements from the file, one line at a time'''
     with open(file_name) as f:
-        lines = f.readlines()
-        prev_measurement = None
-        increased_depth_count = 0
-        for line in lines:
-            current_measurement = int(line)
-            if prev_measurement and prev_measurement < current_measurement:
-                increased_depth_count += 1
-            prev_measurement = current_measurement
-
-    print(f'Number of depth increases using basic calculation: {increased_depth_count}')
-
-def part_two():
-    '''Use sliding window calculation to help remove noise from input data'''
-    file_name = sys.argv[1]
+        for line in f:
+            if line.strip():
+                yield int(line)
+
+class DepthIncreaseCounter:
+    '''Running depth increase counts for a set of sliding window sizes.
+
+    Two neighbouring windows of size N share N-1 measurements, so comparing their sums
+    is the same as comparing a[i+N] with a[i]. Only the last max(window_sizes)
+    measurements are kept in a ring buffer, which lets the counts be updated as new
+    measurements arrive.
+    '''
+    def __init__(self, window_sizes=(1, 3)):
+        self.history = deque(maxlen=max(window_sizes))
+        self.increased_depth_counts = {window_size: 0 for window_size in window_sizes}
+
+    def add(self, measurement):
+        for window_size, count in self.increased_depth_counts.items():
+            if len(self.history) >= window_size and self.history[-window_size] < measurement:
+                self.increased_depth_counts[window_size] = count + 1
+        self.history.append(measurement)
+
+    def add_all(self, measurements):
+        for measurement in measurements:
+            self.add(measurement)
+        return self.increased_depth_counts
 
+def count_increases(measurements, window_sizes=(1, 3)):
+    '''Count depth increases for every sliding window size in a single pass'''
+    return DepthIncreaseCounter(window_sizes).add_all(measurements)
+
+def follow_lines(file_name, poll_interval=1.0):
+    '''Yield lists of complete lines as they are appended to the file, forever.
+
+    Only the bytes added since the last read are consumed; a trailing partial line is
+    held back until its newline arrives.
+    '''
+    partial_line = ''
     with open(file_name) as f:
-        measurements = [int(line) for line in f.readlines()]
-        prev_measurement_window = None
-        increased_depth_count = 0
-        for i in range(len(measurements)):
-            if (i + 2 == len(measurements)):
-                break
+        while True:
+            data = f.read()
+            if not data:
+                time.sleep(poll_interval)
+                continue
+            lines = (partial_line + data).split('\n')
+            partial_line = lines.pop()
+            if lines:
+                yield lines
+
+def load_measurements(file_name, cache=False):
+    '''Bulk parse all depth measurements into an integer array.
+
+    With cache, the parsed array is saved next to the input as a .npy file and
+    memory-mapped on later runs. The cache starts with the size and st_mtime_ns of the
+    input it was parsed from, and is only used while both still match. If the cache
+    can't be written the parsed array is used as is.
+    '''
+    cache_name = f'{file_name}.npy'
+    stat = os.stat(file_name)
+    if cache and os.path.exists(cache_name):
+        cached = np.load(cache_name, mmap_mode='r')
+        if len(cached) >= 2 and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2:]
+
+    measurements = np.fromfile(file_name, dtype=np.int64, sep='\n')
+    if cache:
+        try:
+            np.save(cache_name, np.concatenate(([stat.st_size, stat.st_mtime_ns], measurements)))
+        except OSError as e:
+            print(f'Could not cache parsed measurements at {cache_name}: {e}')
+    return measurements
+
+def count_increases_bulk(measurements, window_sizes=(1, 3)):
+    '''Vectorized version of count_increases using array diffs of a[i+N] against a[i]'''
+    return {window_size: int(np.count_nonzero(measurements[window_size:] > measurements[:-window_size])) for window_size in window_sizes}
+
+def follow(file_name, window_sizes=(1, 3)):
+    '''Keep counting increases as measurements are appended, printing the updated answers'''
+    counter = DepthIncreaseCounter(window_sizes)
+    for lines in follow_lines(file_name):
+        increased_depth_counts = counter.add_all(int(line) for line in lines if line.strip())
+        part_one(increased_depth_counts)
+        part_two(increased_depth_counts)
+
+def part_one(increased_depth_counts):
+    print(f'Number of depth increases using basic calculation: {increased_depth_counts[1]}')
+
+def part_two(increased_depth_counts):
+    '''Use sliding window calculation to help remove noise from input data'''
+    print(f'Number of depth increases using sliding window calculation: {increased_depth_counts[3]}')
+
 
-            current_measurement_window = measurements[i] + measurements[i+1] + measurements[i+2]
-            if prev_measurement_window and prev_measurement_window < current_measurement_window:
-                increased_depth_count += 1
+def main(args):
+    if len(args) < 2 or args[2:] not in [[], ['--bulk'], ['--bulk', '--cache'], ['--follow']]:
+        print('Need to provide file input (optionally followed by --bulk, --bulk --cache or --follow)')
+        return
 
-            prev_measurement_window = current_measurement_window
+    if args[2:] == ['--follow']:
+        follow(args[1])
+        return
 
-    print(f'Number of depth increases using sliding window calculation: {increased_depth_count}')
+    if args[2:3] == ['--bulk']:
+        increased_depth_counts = count_increases_bulk(load_measurements(args[1], cache=args[3:] == ['--cache']), window_sizes=(1, 3))
+    else:
+        increased_depth_counts = count_increases(read_measurements(args[1]), window_sizes=(1, 3))
 
+    part_one(increased_depth_counts)
+    part_two(increased_depth_counts)
 
 if __name__ == '__main__':
-    part_one()
-    part_two()
+    main(sys.argv)
@@ -1,42 +1,179 @@
 # https://adventofcode.com/2021/day/10
 
+import os
+import random
 import sys
+from multiprocessing import Pool
+
+SAMPLE_FILE = './sample_input.txt'
+
+def test_get_lines():
+    lines = get_lines(SAMPLE_FILE)
+    assert sum(line.score for line in lines if line.corrupt) == 26397
+    assert middle_score([line.score for line in lines if line.incomplete]) == 288957
+
+def test_validate_file_parallel():
+    corrupt_score, completion_scores = validate_file_parallel(SAMPLE_FILE, chunks=4)
+    assert corrupt_score == 26397
+    assert middle_score(completion_scores) == 288957
+
+def test_validate_file_blank_lines(tmp_path):
+    navigation = tmp_path / 'navigation.txt'
+    navigation.write_text('((\n\n[[\n(]')
+    assert validate_file_parallel(str(navigation), chunks=2) == (57, [6, 0, 12])
+    lines = get_lines(str(navigation))
+    assert [line.score for line in lines] == [6, 0, 12, 57]
+
+def test_check_line():
+    assert check_line('{([(<{}[<>[]}>{[]{[(<()>') == (True, 1197)
+    assert check_line('<{([{{}}[<[[[<>{}]]]>[]]') == (False, 294)
+    assert check_line('(' * 100000 + ')' * 99999) == (False, 1)
+
+def test_check_line_ending():
+    assert check_line('(]\n') == (True, 57)
+    assert check_line('(((\n') == (False, 31)
+    assert check_line(b'<{([\r\n') == (False, 294)
+
+def test_syntax_checker():
+    checker = SyntaxChecker()
+    assert checker.feed(b'[({(<(())[]>[[{[]{<()<>>\n{([(<{}[<>[') == []
+    # the open line would be completed by ']]>)])}'
+    assert checker.completion_score() == 40183
+    assert checker.feed(b']}') == [1197]
+    assert checker.corrupt
+    assert checker.feed(b'>{[]{[(<()>\n<{([') == []
+    assert checker.feed(b'{{}}[<[[[<>{}]]]>[]]\n') == []
+    assert checker.corrupt_score == 1197
+    assert checker.completion_scores == [288957, 294]
+
+def test_syntax_checker_line_ending_in_same_feed():
+    checker = SyntaxChecker()
+    assert checker.feed(b'(]\n') == [57]
+    assert not checker.corrupt
+    assert checker.feed(b'{([(<{}[<>[]}>{[]{[(<()>\n[[<[([]))<([[{}[[()]]]\n((\n') == [1197, 3]
+    assert checker.corrupt_score == 57 + 1197 + 3
+    assert checker.completion_scores == [6]
+
+def test_middle_score():
+    assert middle_score([5, 1, 4, 4, 2]) == 4
 
 OPENING_CHARS = ['(', '[', '{', '<']
 CLOSING_CHARS = [')', ']', '}', '>']
-CLOSING_TO_OPENING_CHAR = {CLOSING_CHAR: OPENING_CHAR for OPENING_CHAR, CLOSING_CHAR in zip(OPENING_CHARS, CLOSING_CHARS)}
-OPENING_TO_CLOSING_CHAR = {OPENING_CHAR: CLOSING_CHAR for OPENING_CHAR, CLOSING_CHAR in zip(OPENING_CHARS, CLOSING_CHARS)}
 
 ILLEGAL_CHAR_SCORE = {')': 3, ']': 57, '}': 1197, '>': 25137}
-INCOMPLETE_CHAR_SCORE = {')': 1, ']': 2, '}': 3, '>': 4}
 
-class Line:
-    def __init__(self, data):
-        self.data = data
+# char codes after translation, 1-4 are the opening chars and 5-8 their closing chars.
+# The completion score of a closing char is the code of its opening char.
+NEWLINE_CODE = 9
+SKIPPED_CODE = 10
+
+def create_char_code_table():
+    '''Translation table mapping every byte to its char code, 0 for unexpected chars'''
+    table = bytearray(256)
+    for i, (opening_char, closing_char) in enumerate(zip(OPENING_CHARS, CLOSING_CHARS)):
+        table[ord(opening_char)] = i + 1
+        table[ord(closing_char)] = i + 5
+    table[ord('\n')] = NEWLINE_CODE
+    table[ord('\r')] = SKIPPED_CODE
+    return bytes(table)
+
+CHAR_CODE_TABLE = create_char_code_table()
+ILLEGAL_CODE_SCORE = [0] * 5 + [ILLEGAL_CHAR_SCORE[char] for char in CLOSING_CHARS]
+
+class SyntaxChecker:
+    '''Incremental syntax checker for navigation input that arrives in arbitrary pieces.
+
+    The open chunks of the current line are kept on a stack between feeds, so each byte
+    costs O(1) work. Corruption is reported as soon as an illegal closing char arrives,
+    and the completion score of the current line is available at any time. A newline
+    ends the current line and adds it to the totals of finished lines.
+
+    Each feed returns the illegal char scores of the lines that became corrupt during
+    it, so a corrupt line isn't missed when its newline arrives in the same piece.
+    '''
+    def __init__(self):
+        self.stack = []
         self.corrupt = False
-        self.incomplete = False
-        self.score = None
-        current_chunk = ''
-        for char in data:
-            if char in OPENING_CHARS:
-                current_chunk += char
-            elif char in CLOSING_CHARS:
-                if not CLOSING_TO_OPENING_CHAR[char] == current_chunk[-1]:
+        self.illegal_char_score = 0
+        # totals of finished lines
+        self.corrupt_score = 0
+        self.completion_scores = []
+
+    def feed(self, data):
+        '''Check more bytes of input, returns the illegal char scores of lines found corrupt'''
+        if isinstance(data, str):
+            data = data.encode()
+        illegal_char_scores = []
+        stack = self.stack
+        for code in data.translate(CHAR_CODE_TABLE):
+            if code == NEWLINE_CODE:
+                self.end_line()
+                stack = self.stack
+            elif self.corrupt or code == SKIPPED_CODE:
+                continue
+            elif code > 4:
+                if not stack or stack.pop() != code - 4:
                     self.corrupt = True
-                    self.score = ILLEGAL_CHAR_SCORE[char]
-                    break
-                current_chunk = current_chunk[:-1]
+                    self.illegal_char_score = ILLEGAL_CODE_SCORE[code]
+                    illegal_char_scores.append(self.illegal_char_score)
+            elif code:
+                stack.append(code)
             else:
                 print('illegal char detected - oh no I should be an error but I\'m lazy')
+        return illegal_char_scores
+
+    def completion_score(self):
+        '''Score of the closing chars that would complete the current line (0 if corrupt)'''
+        if self.corrupt:
+            return 0
+        # the opening code of a chunk is also the completion score of its closing char
+        total_score = 0
+        for code in reversed(self.stack):
+            total_score = total_score * 5 + code
+        return total_score
+
+    def end_line(self):
+        if self.corrupt:
+            self.corrupt_score += self.illegal_char_score
+        else:
+            self.completion_scores.append(self.completion_score())
+        self.stack = []
+        self.corrupt = False
+        self.illegal_char_score = 0
+
+def check_line(data):
+    '''Returns (corrupt, score) for a navigation line, in time linear in its length'''
+    if isinstance(data, str):
+        data = data.encode()
+    checker = SyntaxChecker()
+    # a line ending would finish the line and reset the checker before it is scored
+    checker.feed(data.rstrip(b'\r\n'))
+    if checker.corrupt:
+        return True, checker.illegal_char_score
+    return False, checker.completion_score()
+
+def middle_score(scores):
+    '''Returns the middle of an odd number of scores in expected linear time (quickselect)'''
+    assert len(scores) % 2 != 0
+    k = len(scores) // 2
+    while True:
+        pivot = random.choice(scores)
+        lower = [score for score in scores if score < pivot]
+        if k < len(lower):
+            scores = lower
+            continue
+        pivot_count = scores.count(pivot)
+        if k < len(lower) + pivot_count:
+            return pivot
+        k -= len(lower) + pivot_count
+        scores = [score for score in scores if score > pivot]
+
+class Line:
+    def __init__(self, data):
+        self.data = data
+        self.corrupt, self.score = check_line(data)
+        self.incomplete = not self.corrupt
 
-        if not self.corrupt:
-            self.incomplete = True
-            total_score = 0
-            for char in current_chunk[::-1]:
-                total_score *= 5
-                total_score += INCOMPLETE_CHAR_SCORE[OPENING_TO_CLOSING_CHAR[char]]
-            self.score = total_score
-        
     def __repr__(self):
         return f'( Line: data:{self.data}, corrupt:{self.corrupt}, score:{self.score} )'
     
@@ -44,9 +181,54 @@ def get_lines(file_name):
     with open(file_name) as f:
         return [Line(line.strip()) for line in f.readlines()]
 
+def chunk_byte_ranges(file_name, chunks):
+    '''Split the file into at most `chunks` byte ranges that start and end on line boundaries'''
+    file_size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, 'rb') as f:
+        for i in range(1, chunks):
+            f.seek(max(boundaries[-1], file_size * i // chunks))
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def validate_chunk(chunk):
+    '''Returns (sum of corrupt line scores, completion scores) for a byte range of the file'''
+    file_name, start, end = chunk
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    checker = SyntaxChecker()
+    checker.feed(data)
+    # the last line of the file may not have a newline to end it
+    if data and not data.endswith(b'\n'):
+        checker.end_line()
+    return checker.corrupt_score, checker.completion_scores
+
+def validate_file_parallel(file_name, chunks=None):
+    '''Validate byte range chunks of the file in a process pool, without keeping Line objects.
+
+    Returns (sum of corrupt line scores, completion scores of every incomplete line).
+    '''
+    chunks = chunks or os.cpu_count()
+    byte_ranges = chunk_byte_ranges(file_name, chunks)
+    corrupt_score, completion_scores = 0, []
+    with Pool(processes=min(chunks, len(byte_ranges) or 1)) as pool:
+        for chunk_corrupt_score, chunk_completion_scores in pool.imap(validate_chunk, [(file_name, start, end) for start, end in byte_ranges]):
+            corrupt_score += chunk_corrupt_score
+            completion_scores.extend(chunk_completion_scores)
+    return corrupt_score, completion_scores
+
 def main(args):
-    if len(args) != 2:
-        print('Need to provide file input')
+    if len(args) not in [2, 3]:
+        print('Need to provide file input (optionally followed by --parallel)')
+        return
+
+    if args[2:] == ['--parallel']:
+        corrupt_score, completion_scores = validate_file_parallel(args[1])
+        print(f'Part One: Corrupted line scores: {corrupt_score}')
+        print(f'Part Two: Incomplete line scores: {middle_score(completion_scores)}')
         return
 
     lines = get_lines(args[1])
@@ -54,10 +236,8 @@ def main(args):
     print(f'Part One: Corrupted line scores: {sum(corrupted_scores)}')
 
     incomplete_scores = [line.score for line in lines if line.incomplete]
-    # Now perform weird task where we are asked so sort the list and take middle score
-    incomplete_scores.sort()
-    assert len(incomplete_scores) % 2 != 0
-    print(f'Part Two: Incomplete line scores: {incomplete_scores[int(len(incomplete_scores)/2)]}')
+    # Now perform weird task where we are asked to take the middle score
+    print(f'Part Two: Incomplete line scores: {middle_score(incomplete_scores)}')
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -91,6 +91,61 @@ class OctoSim:
                 self.octi[i][j].energy_level = 0
                 self.octi[i][j].flashed = False
 
+class EnergyGridSim:
+    '''Octopus simulation on an integer energy grid.
+
+    Energy levels are incremented in place. Flashes spread in waves: every wave adds,
+    to each octopus, the number of its neighbours that just flashed, counted by summing
+    shifted views of the flash mask.
+    '''
+    def __init__(self, energy_levels):
+        self.energy_levels = np.array(energy_levels, dtype=np.int32)
+        rows, cols = self.energy_levels.shape
+        # neighbour flash counts, padded by one cell on every side
+        self.neighbour_flashes = np.zeros((rows+2, cols+2), dtype=np.int32)
+        self.step_count = 0
+        self.flash_count = 0
+        # steps where all octi flash
+        self.synchronized_steps = []
+
+    @staticmethod
+    def init_from_file(file_name):
+        with open(file_name) as f:
+            return EnergyGridSim([[int(level) for level in line.strip()] for line in f.readlines() if line.strip()])
+
+    def step(self):
+        '''Step the simulation forward'''
+        self.step_count += 1
+        energy_levels = self.energy_levels
+        rows, cols = energy_levels.shape
+        energy_levels += 1
+
+        flashed = energy_levels > 9
+        flashing = flashed.copy()
+        while flashing.any():
+            self.neighbour_flashes.fill(0)
+            for i, j in itertools.product(range(3), range(3)):
+                if (i, j) != (1, 1):
+                    self.neighbour_flashes[i:i+rows, j:j+cols] += flashing
+            energy_levels += self.neighbour_flashes[1:-1, 1:-1]
+            flashing = (energy_levels > 9) & ~flashed
+            flashed |= flashing
+
+        flashes = int(np.count_nonzero(flashed))
+        self.flash_count += flashes
+        if flashes == energy_levels.size:
+            self.synchronized_steps.append(self.step_count)
+        energy_levels[flashed] = 0
+
+def test_energy_grid_sim_matches_octo_sim():
+    octo_sim = OctoSim('./sample_input.txt')
+    energy_grid_sim = EnergyGridSim.init_from_file('./sample_input.txt')
+    for _ in range(20):
+        octo_sim.step()
+        energy_grid_sim.step()
+        assert octo_sim.flash_count == energy_grid_sim.flash_count
+        assert np.array_equal(np.vectorize(lambda octopus: octopus.energy_level)(octo_sim.octi), energy_grid_sim.energy_levels)
+
 def test_part_one():
     assert part_one('./sample_input.txt') == 1656
 
@@ -98,7 +153,7 @@ def part_one(file_name):
     '''Given the starting energy levels of the dumbo octopuses in your cavern, simulate 100 steps. 
     Return total number of flashes after 100 steps
     '''
-    sim = OctoSim(file_name)
+    sim = EnergyGridSim.init_from_file(file_name)
     for _ in range(100):
         sim.step()
     return sim.flash_count
@@ -108,7 +163,7 @@ def test_part_two():
 
 def part_two(file_name):
     '''What is the first step where all octopuses flash at once?'''
-    sim = OctoSim(file_name)
+    sim = EnergyGridSim.init_from_file(file_name)
     while len(sim.synchronized_steps) == 0:
         sim.step()
     return sim.synchronized_steps[0]
@@ -1,5 +1,54 @@
 # https://adventofcode.com/2021/day/2
+import os
 import sys
+import time
+import numpy as np
+from functools import reduce
+from multiprocessing import Pool
+
+SAMPLE_FILE = './sample_input.txt'
+
+FORWARD, DOWN, UP = 0, 1, 2
+OPCODES = {b'forward': FORWARD, b'down': DOWN, b'up': UP}
+# values have at most 18 digits to fit in int64
+MAX_VALUE_DIGITS = 18
+# longest command line the byte parser looks at, the longest direction with a value of the most digits
+MAX_COMMAND_LENGTH = len('forward ') + MAX_VALUE_DIGITS
+
+def test_process_encoded_commands_simple():
+    assert process_encoded_commands_simple(*encode_commands(SAMPLE_FILE)) == (15, 10)
+
+def test_process_encoded_commands_complex():
+    assert process_encoded_commands_complex(*encode_commands(SAMPLE_FILE)) == (15, 60)
+
+def test_parallel_summary():
+    assert process_commands_parallel(SAMPLE_FILE, chunks=4) == (15, 60, 10)
+
+def test_encode_command_bytes():
+    opcodes, values = encode_command_bytes(b'forward 12\r\n\nup 3\ndown 105')
+    assert list(opcodes) == [FORWARD, UP, DOWN] and list(values) == [12, 3, 105]
+
+def test_encode_command_bytes_rejects_malformed_lines():
+    for data in [b'fishnet 5\n', b'deep 7\n', b'up 1 2\n', b'up\n', b'up \n', b'down -3\n', b'forward  5\n', b'up 5x\n', b'up ' + b'9' * 19 + b'\n']:
+        try:
+            encode_command_bytes(data)
+        except ValueError:
+            continue
+        assert False, f'{data} should not parse'
+
+def test_combine_summaries():
+    opcodes, values = encode_commands(SAMPLE_FILE)
+    summaries = [summarize_commands(opcodes[i:i+1], values[i:i+1]) for i in range(len(opcodes))]
+    assert reduce(combine_summaries, summaries) == summarize_commands(opcodes, values)
+
+def test_follow_commands(tmp_path):
+    log = tmp_path / 'commands.txt'
+    log.write_bytes(b'forward 5\ndown 5\nforw')
+    updates = follow_commands(log, poll_interval=0)
+    assert next(updates) == (5, 0, 5)
+    with open(log, 'ab') as f:
+        f.write(b'ard 8\nup 3\ndown 8\nforward 2\n')
+    assert next(updates) == (15, 60, 10)
 
 def process_input_file(input_file):
     with open(input_file) as f:
@@ -41,6 +90,137 @@ def process_commands_complex(commands):
             return
     print (f'After processing commands, final horizontal_position*depth = {horizontal_position*depth}')
 
+def encode_commands(input_file):
+    '''Encode the commands of the input file into integer opcode and value arrays'''
+    with open(input_file, 'rb') as f:
+        return encode_command_bytes(f.read())
+
+def encode_command_bytes(data):
+    '''Encode raw command text into integer opcode and value arrays.
+
+    Parsing works on the raw bytes, one column of the fixed-width line layout at a time:
+    the direction word and its single space are compared in full against each known
+    direction, and everything after the space must be the digits of one integer.
+    '''
+    buffer = np.frombuffer(data if data.endswith(b'\n') else data + b'\n', dtype=np.uint8)
+    line_ends = np.flatnonzero(buffer == ord('\n'))
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    line_ends = line_ends - ((line_ends > line_starts) & (buffer[line_ends - 1] == ord('\r')))
+    blank = line_ends == line_starts
+    line_starts, line_ends = line_starts[~blank], line_ends[~blank]
+    line_lengths = line_ends - line_starts
+
+    def invalid_line(valid):
+        bad_line = np.argmax(~valid)
+        return ValueError(f'error parsing command: {bytes(buffer[line_starts[bad_line]:line_ends[bad_line]])}')
+
+    too_long = line_lengths > MAX_COMMAND_LENGTH
+    if np.any(too_long):
+        raise invalid_line(~too_long)
+
+    def column(i):
+        return np.where(i < line_lengths, buffer[np.minimum(line_starts + i, len(buffer) - 1)], 0)
+
+    opcodes = np.full(len(line_starts), -1, dtype=np.int8)
+    value_starts = np.zeros(len(line_starts), dtype=np.int64)
+    for direction, opcode in OPCODES.items():
+        matches = np.ones(len(line_starts), dtype=bool)
+        for i, char in enumerate(direction + b' '):
+            matches &= column(i) == char
+        opcodes[matches] = opcode
+        value_starts[matches] = len(direction) + 1
+
+    valid = (opcodes != -1) & (line_lengths > value_starts) & (line_lengths - value_starts <= MAX_VALUE_DIGITS)
+    values = np.zeros(len(line_starts), dtype=np.int64)
+    for i in range(1, line_lengths.max() if len(line_lengths) else 0):
+        chars = column(i)
+        in_value = (i >= value_starts) & (i < line_lengths)
+        valid &= ~in_value | ((chars >= ord('0')) & (chars <= ord('9')))
+        values = np.where(in_value, values * 10 + chars - ord('0'), values)
+    if not np.all(valid):
+        raise invalid_line(valid)
+    return opcodes, values
+
+def process_encoded_commands_simple(opcodes, values):
+    '''Returns final (horizontal_position, depth) where up/down change depth directly'''
+    horizontal_position = values[opcodes == FORWARD].sum()
+    depth = values[opcodes == DOWN].sum() - values[opcodes == UP].sum()
+    return int(horizontal_position), int(depth)
+
+def process_encoded_commands_complex(opcodes, values):
+    '''Returns final (horizontal_position, depth) where up/down change aim.
+
+    Aim is the running sum of down/up values, and depth is the dot product of that aim
+    with the forward values.
+    '''
+    forward_values = np.where(opcodes == FORWARD, values, 0)
+    aim = np.cumsum(np.where(opcodes == DOWN, values, 0) - np.where(opcodes == UP, values, 0))
+    return int(forward_values.sum()), int(np.dot(aim, forward_values))
+
+def summarize_commands(opcodes, values):
+    '''Reduce commands to a (horizontal_position, depth, aim) summary, starting from aim 0'''
+    horizontal_position, depth = process_encoded_commands_complex(opcodes, values)
+    _, aim = process_encoded_commands_simple(opcodes, values)
+    return horizontal_position, depth, aim
+
+def combine_summaries(first, second):
+    '''Combine the summaries of two consecutive runs of commands.
+
+    The second run was summarized starting from aim 0, so each of its forward moves
+    also picks up the aim left over from the first run.
+    '''
+    horizontal_position, depth, aim = first
+    next_horizontal_position, next_depth, next_aim = second
+    return (horizontal_position + next_horizontal_position,
+            depth + next_depth + aim * next_horizontal_position,
+            aim + next_aim)
+
+def chunk_byte_ranges(input_file, chunks):
+    '''Split the input file into at most `chunks` byte ranges that start and end on line boundaries'''
+    file_size = os.path.getsize(input_file)
+    boundaries = [0]
+    with open(input_file, 'rb') as f:
+        for i in range(1, chunks):
+            f.seek(max(boundaries[-1], file_size * i // chunks))
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def summarize_command_chunk(chunk):
+    input_file, start, end = chunk
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        return summarize_commands(*encode_command_bytes(f.read(end - start)))
+
+def process_commands_parallel(input_file, chunks=None):
+    '''Summarize byte-range chunks of the input file in a process pool and combine the summaries'''
+    chunks = chunks or os.cpu_count()
+    byte_ranges = chunk_byte_ranges(input_file, chunks)
+    with Pool(processes=min(chunks, len(byte_ranges) or 1)) as pool:
+        summaries = pool.map(summarize_command_chunk, [(input_file, start, end) for start, end in byte_ranges])
+    return reduce(combine_summaries, summaries, (0, 0, 0))
+
+def follow_commands(input_file, poll_interval=1.0):
+    '''Yield the updated (horizontal_position, depth, aim) summary every time complete
+    commands are appended to the input file, forever.
+
+    Only newly appended bytes are read and encoded; a trailing partial line is held back
+    until its newline arrives.
+    '''
+    summary = (0, 0, 0)
+    partial_line = b''
+    with open(input_file, 'rb') as f:
+        while True:
+            data = f.read()
+            if not data:
+                time.sleep(poll_interval)
+                continue
+            complete, _, partial_line = (partial_line + data).rpartition(b'\n')
+            if complete:
+                summary = combine_summaries(summary, summarize_commands(*encode_command_bytes(complete)))
+                yield summary
+
 
 def part_one():
     process_commands_simple(process_input_file(sys.argv[1]))
@@ -48,10 +228,30 @@ def part_one():
 def part_two():
     process_commands_complex(process_input_file(sys.argv[1]))
 
+def part_two_batch():
+    horizontal_position, depth = process_encoded_commands_complex(*encode_commands(sys.argv[1]))
+    print (f'After processing commands, final horizontal_position*depth = {horizontal_position*depth}')
+
+def part_two_parallel():
+    horizontal_position, depth, _ = process_commands_parallel(sys.argv[1])
+    print (f'After processing commands, final horizontal_position*depth = {horizontal_position*depth}')
+
+def follow():
+    for horizontal_position, depth, aim in follow_commands(sys.argv[1]):
+        # with the simple interpretation of up/down, depth is the same as aim
+        print (f'After processing commands, simple horizontal_position*depth = {horizontal_position*aim}, '
+               f'complex horizontal_position*depth = {horizontal_position*depth}')
+
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
+    if len(sys.argv) not in [2, 3]:
         print('Need argument for input!')
+    elif sys.argv[2:] == ['--batch']:
+        part_two_batch()
+    elif sys.argv[2:] == ['--parallel']:
+        part_two_parallel()
+    elif sys.argv[2:] == ['--follow']:
+        follow()
     else:
         # part_one()
-        part_two()
\ No newline at end of file
+        part_two()
@@ -1,60 +1,108 @@
 # https://adventofcode.com/2021/day/3
 
 import sys
+from bisect import bisect_left
+import numpy as np
 
-def process_input_file(input_file):
-    with open(input_file) as f:
-        lines = f.readlines()
-        return [line.strip() for line in lines]
+SAMPLE_FILE = './sample_input.txt'
 
-def calc_bit_frequencies(diagnostics):
-    binary_length = len(diagnostics[0])
-    bit_frequencies = [{'0': 0, '1': 0} for _ in range(binary_length)]
-    for binary in diagnostics:
-        for i in range(binary_length):
-            bit_frequencies[i][binary[i]] += 1
-    return bit_frequencies
+def test_power_rates():
+    assert power_rates(parse_diagnostic_bits(SAMPLE_FILE)) == (22, 9)
 
-def most_common_bits(diagnostics, value_if_equal='0'):
-    bit_frequencies = calc_bit_frequencies(diagnostics)
-    return [value_if_equal if bit_frequency['0'] == bit_frequency['1'] else '0' if bit_frequency['0'] > bit_frequency['1'] else '1' for bit_frequency in bit_frequencies]
+def test_power_rates_ties():
+    # ties count as '0' for both the most and the least common bit
+    assert power_rates(np.array([[1, 1], [0, 1]], dtype=np.uint8)) == (1, 0)
 
-def least_common_bits(diagnostics, value_if_equal='0'):
-    bit_frequencies = calc_bit_frequencies(diagnostics)
-    return [value_if_equal if bit_frequency['0'] == bit_frequency['1'] else '1' if bit_frequency['0'] > bit_frequency['1'] else '0' for bit_frequency in bit_frequencies]
+def test_ratings():
+    diagnostic_bits = parse_diagnostic_bits(SAMPLE_FILE)
+    assert ratings(diagnostic_bits) == (23, 10)
 
-def part_one_process(diagnostics):
-    print('Processing part one:')
+def test_ratings_wide_readings():
+    # padding the sample with 70 leading zero bits must not change the ratings
+    diagnostic_bits = parse_diagnostic_bits(SAMPLE_FILE)
+    assert ratings(np.pad(diagnostic_bits, ((0, 0), (70, 0)))) == (23, 10)
 
-    gamma_binary = ''.join(most_common_bits(diagnostics))
-    gamma_rate = int(gamma_binary, 2)
+def parse_diagnostic_bits(input_file):
+    '''Parse the diagnostic report into a (readings, bits) matrix of 0/1 values'''
+    with open(input_file, 'rb') as f:
+        readings = f.read().split()
+    binary_length = len(readings[0])
+    return (np.frombuffer(b''.join(readings), dtype=np.uint8).reshape(len(readings), binary_length) - ord('0'))
 
-    epsilon_binary = ''.join(least_common_bits(diagnostics))
-    epsilon_rate = int(epsilon_binary, 2)
+def bits_to_int(bits):
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
 
-    power_consumption = gamma_rate * epsilon_rate
-    print(f'The Power consumption is {power_consumption}') 
+def power_rates(diagnostic_bits):
+    '''Returns (gamma_rate, epsilon_rate) using column sums of the bit matrix.
+
+    Bits where ones and zeros are equally common are 0 in both rates.
+    '''
+    ones = np.count_nonzero(diagnostic_bits, axis=0)
+    zeros = len(diagnostic_bits) - ones
+    gamma_rate = bits_to_int(ones > zeros)
+    tied_mask = bits_to_int(ones == zeros)
+    all_bits_mask = (1 << diagnostic_bits.shape[1]) - 1
+    epsilon_rate = ~gamma_rate & ~tied_mask & all_bits_mask
+    return gamma_rate, epsilon_rate
+
+def sorted_diagnostic_values(diagnostic_bits):
+    '''Pack each reading of the bit matrix into an integer and sort them.
+
+    Readings of up to 64 bits are packed into a uint64 array, wider readings into a
+    list of Python ints.
+    '''
+    binary_length = diagnostic_bits.shape[1]
+    if binary_length > 64:
+        padding = -binary_length % 8
+        packed = np.packbits(np.pad(diagnostic_bits, ((0, 0), (padding, 0))), axis=1)
+        return sorted(int.from_bytes(reading.tobytes(), 'big') for reading in packed)
+    values = np.zeros(len(diagnostic_bits), dtype=np.uint64)
+    for column in diagnostic_bits.T:
+        values = (values << np.uint64(1)) | column
+    values.sort()
+    return values
+
+def rating_value(sorted_values, binary_length, keep_most_common):
+    '''Find a rating by narrowing a range of the sorted readings one bit at a time.
 
-def rating_binary(diagnostics, bit_criteria, equivalence_value):
-    copy_diagnostics = [binary for binary in diagnostics]
-    binary_length = len(copy_diagnostics[0])
-    for i in range(binary_length):
-        if (len(copy_diagnostics) == 1):
+    Surviving readings share their leading bits, so they are always a contiguous range
+    of the sorted array and the split between a 0 and a 1 at the current bit is found
+    with a binary search.
+    '''
+    start, end = 0, len(sorted_values)
+    prefix = 0
+    for bit in reversed(range(binary_length)):
+        if end - start == 1:
             break
-        bit_criteria_bits = bit_criteria(copy_diagnostics, equivalence_value)
-        copy_diagnostics = list(filter(lambda binary: binary[i] == bit_criteria_bits[i], copy_diagnostics))
+        split = bisect_left(sorted_values, prefix | (1 << bit), start, end)
+        zeros, ones = split - start, end - split
+        keep_ones = ones >= zeros if keep_most_common else ones < zeros
+        if (keep_ones and ones > 0) or zeros == 0:
+            start = split
+            prefix |= 1 << bit
+        else:
+            end = split
+    return int(sorted_values[start])
 
-    return copy_diagnostics[0]
+def ratings(diagnostic_bits):
+    '''Returns (oxygen_gen_rating, co2_scrubber_rating)'''
+    sorted_values = sorted_diagnostic_values(diagnostic_bits)
+    binary_length = diagnostic_bits.shape[1]
+    return rating_value(sorted_values, binary_length, True), rating_value(sorted_values, binary_length, False)
 
-def part_two_process(diagnostics):
+def part_one_process(diagnostic_bits):
+    print('Processing part one:')
+
+    gamma_rate, epsilon_rate = power_rates(diagnostic_bits)
+
+    power_consumption = gamma_rate * epsilon_rate
+    print(f'The Power consumption is {power_consumption}') 
+
+def part_two_process(diagnostic_bits):
     print('Processing part two:')
     
-    oxygen_gen_rating_bin = rating_binary(diagnostics, most_common_bits, '1')
-    oxygen_gen_rating = int(oxygen_gen_rating_bin, 2)
+    oxygen_gen_rating, co2_scrubber_rating = ratings(diagnostic_bits)
     print(f'Oxygen generation rating is {oxygen_gen_rating}')
-
-    co2_scrubber_rating_bin = rating_binary(diagnostics, least_common_bits, '0')
-    co2_scrubber_rating = int(co2_scrubber_rating_bin, 2)
     print(f'CO2 Scrubber rating is {co2_scrubber_rating}')
 
     life_support_rating = oxygen_gen_rating * co2_scrubber_rating
@@ -62,6 +110,6 @@ def part_two_process(diagnostics):
 
 if __name__ == '__main__':
     if len(sys.argv) == 2:
-        diagnostics = process_input_file(sys.argv[1])
-        part_one_process(diagnostics)
-        part_two_process(diagnostics)
\ No newline at end of file
+        diagnostic_bits = parse_diagnostic_bits(sys.argv[1])
+        part_one_process(diagnostic_bits)
+        part_two_process(diagnostic_bits)
\ No newline at end of file
@@ -1,9 +1,27 @@
 # https://adventofcode.com/2021/day/4
 
+from collections import defaultdict
 from dataclasses import dataclass
 import numpy as np
 import sys
 
+SAMPLE_FILE = './sample_input.txt'
+
+def test_indexed_bingo_game():
+    bingo = IndexedBingoGame.create_from_file_input(SAMPLE_FILE)
+    bingo.play()
+    assert [bingo.score(board_index) for board_index in bingo.completed_boards] == [4512, 2192, 1924]
+
+def test_solve_bingo():
+    assert solve_bingo(*parse_bingo_file(SAMPLE_FILE)) == [(2, 24, 4512), (0, 16, 2192), (1, 13, 1924)]
+
+def test_indexed_bingo_game_matches_bingo_game():
+    draws, boards = parse_bingo_file(SAMPLE_FILE)
+    bingo, indexed_bingo = BingoGame(draws, boards), IndexedBingoGame(draws, boards)
+    bingo.play()
+    indexed_bingo.play()
+    assert [board.score() for board in bingo.completed_boards] == [indexed_bingo.score(board_index) for board_index in indexed_bingo.completed_boards]
+
 @dataclass
 class BingoSquare:
     number: int
@@ -78,26 +96,112 @@ class BingoGame:
 
     @staticmethod
     def create_from_file_input(file_name):
-        with open(file_name) as f:
-            lines = [line.strip() for line in f.readlines()]
-            draws = [int(draw) for draw in lines[0].split(',')]
-            boards = [[line.split() for line in [lines[i+j] for j in range(5)]] for i in range(2, len(lines), 6)]
-            return BingoGame(draws, boards)
+        return BingoGame(*parse_bingo_file(file_name))
+
+class IndexedBingoGame:
+    '''Bingo game that finds squares to mark through a number -> (board, row, col) index
+    and detects wins with per row and per column hit counters, so a draw only touches
+    the squares holding the drawn number.
+    '''
+    def __init__(self, draws, boards):
+        self.draws = draws
+        self.boards = [[[int(number) for number in row] for row in board] for board in boards]
+        self.number_index = defaultdict(list)
+        for board_index, board in enumerate(self.boards):
+            for i, row in enumerate(board):
+                for j, number in enumerate(row):
+                    self.number_index[number].append((board_index, i, j))
+        self.row_hits = [[0] * len(board) for board in self.boards]
+        self.col_hits = [[0] * len(board[0]) for board in self.boards]
+        self.marked = [set() for _ in self.boards]
+        self.unmarked_sums = [sum(sum(row) for row in board) for board in self.boards]
+        # turn each board won at, and the number that made it win
+        self.winning_turns = [None] * len(self.boards)
+        self.winning_numbers = [None] * len(self.boards)
+        # completed means won, holds board indices in winning order
+        self.completed_boards = []
+
+    def play(self):
+        for turn, draw in enumerate(self.draws):
+            for board_index, i, j in self.number_index.get(draw, ()):
+                winning_turn = self.winning_turns[board_index]
+                if (winning_turn is not None and winning_turn < turn) or (i, j) in self.marked[board_index]:
+                    continue
+
+                self.marked[board_index].add((i, j))
+                self.unmarked_sums[board_index] -= draw
+                self.row_hits[board_index][i] += 1
+                self.col_hits[board_index][j] += 1
+
+                board = self.boards[board_index]
+                if winning_turn is None and (self.row_hits[board_index][i] == len(board[0]) or self.col_hits[board_index][j] == len(board)):
+                    self.winning_turns[board_index] = turn
+                    self.winning_numbers[board_index] = draw
+                    self.completed_boards.append(board_index)
+
+    def score(self, board_index):
+        '''Returns the score of the board (0 if board has not won yet)'''
+        if self.winning_numbers[board_index] is None:
+            return 0
+        return self.unmarked_sums[board_index] * self.winning_numbers[board_index]
+
+    @staticmethod
+    def create_from_file_input(file_name):
+        return IndexedBingoGame(*parse_bingo_file(file_name))
+
+def solve_bingo(draws, boards):
+    '''Solve the whole game without playing it draw by draw.
+
+    Every square is mapped to the turn its number is drawn, so a row or column is
+    complete at the maximum of its turns and a board wins at the earliest of those.
+    Returns [(board_index, winning_number, score)] in winning order.
+    '''
+    boards = np.array(boards).astype(np.int64)
+    draws = np.array(draws, dtype=np.int64)
+    never_drawn = len(draws)
+
+    draw_turns = np.full(max(boards.max(), draws.max()) + 1, never_drawn)
+    drawn_numbers, first_turns = np.unique(draws, return_index=True)
+    draw_turns[drawn_numbers] = first_turns
+    square_turns = draw_turns[boards]
+
+    winning_turns = np.minimum(square_turns.max(axis=2).min(axis=1), square_turns.max(axis=1).min(axis=1))
+    winning_numbers = draws[np.minimum(winning_turns, never_drawn - 1)]
+    unmarked_sums = np.where(square_turns > winning_turns[:, None, None], boards, 0).sum(axis=(1, 2))
+    scores = unmarked_sums * winning_numbers
+
+    winning_order = np.argsort(winning_turns, kind='stable')
+    winning_order = winning_order[winning_turns[winning_order] < never_drawn]
+    return [(int(board_index), int(winning_numbers[board_index]), int(scores[board_index])) for board_index in winning_order]
+
+def parse_bingo_file(file_name):
+    '''Returns (draws, boards) where boards are lists of rows of number strings'''
+    with open(file_name) as f:
+        lines = [line.strip() for line in f.readlines()]
+        draws = [int(draw) for draw in lines[0].split(',')]
+        boards = [[line.split() for line in [lines[i+j] for j in range(5)]] for i in range(2, len(lines), 6)]
+        return draws, boards
 
 
 def main(args):
-    if len(args) != 2:
-        print('Need file to use as input provided as arg')
+    if len(args) not in [2, 3]:
+        print('Need file to use as input provided as arg (optionally followed by --solve)')
         return
 
     file_name = args[1]
 
-    bingo = BingoGame.create_from_file_input(file_name)
+    if args[2:] == ['--solve']:
+        for i, (_, _, score) in enumerate(solve_bingo(*parse_bingo_file(file_name))):
+            print(f'Score of completed board {i+1}: {score}')
+        return
+
+    bingo = IndexedBingoGame.create_from_file_input(file_name)
 
+    print('Playing Bingo')
     bingo.play()
 
-    for i,completed_board in enumerate(bingo.completed_boards):
-        print(f'Score of completed board {i+1}: {completed_board.score()}')
+    for i, board_index in enumerate(bingo.completed_boards):
+        print(f'Score of completed board {i+1}: {bingo.score(board_index)}')
 
 if __name__ == '__main__':
     main(sys.argv)
\ No newline at end of file
@@ -1,118 +1,163 @@
 # https://adventofcode.com/2021/day/5
 
+import os
 import sys
-from enum import Enum
+from multiprocessing import Pool
 import numpy as np
-import matplotlib.pyplot as plt
-
-class Point:
-    def __init__(self, elements:list):
-        self.x = int(elements[0])
-        self.y = int(elements[1])
-
-    def __repr__(self):
-        return f'Point: x: {self.x}, y: {self.y}'
-
-class LineType(Enum):
-    HORIZONTAL = 0
-    VERTICAL = 1
-    DIAGONAL = 2
-
-class LineSegment:
-    def __init__(self, p1, p2):
-        self.p1 = p1
-        self.p2 = p2
-
-    def __repr__(self):
-        return f'LineSegment: p1: {self.p1}, p2: {self.p2}, type: {self.type()}'
-    
-    def type(self):
-        return LineType.HORIZONTAL if self.p1.y == self.p2.y else (LineType.VERTICAL if self.p1.x == self.p2.x else LineType.DIAGONAL)
-
-    @staticmethod
-    def create_from_file_line(line):
-        line_elements = line.strip().split(' ')
-        return LineSegment(p1=Point(line_elements[0].split(',')), p2=Point(line_elements[2].split(',')))
-
-def parse_line_segments(file_name):
-    with open(file_name) as f:
-        return [LineSegment.create_from_file_line(line) for line in f.readlines()]
-
-def init_board(line_segments):
-    max_x = max_y = 0
-    for segment in line_segments:
-        max_x = segment.p1.x if segment.p1.x > max_x else max_x
-        max_x = segment.p2.x if segment.p2.x > max_x else max_x
-        max_y = segment.p1.y if segment.p1.y > max_y else max_y
-        max_y = segment.p2.y if segment.p2.y > max_y else max_y
-
-    return np.zeros((max_y+1, max_x+1))
-
-def populate_board_with_segments(board, line_segments, ignore=[]):
-    populated_board = np.copy(board)
-    for segment in line_segments:
-        if segment.type() in ignore:
-            continue
-
-        if segment.p1.x == segment.p2.x and segment.p1.y == segment.p2.y:
-            print('oh jeez')
-
-        if segment.type() == LineType.HORIZONTAL:
-            start_x = segment.p1.x if segment.p1.x < segment.p2.x else segment.p2.x
-            end_x = segment.p1.x if segment.p1.x > segment.p2.x else segment.p2.x
-            for x in range(start_x, end_x+1):
-                populated_board[x][segment.p1.y]+=1
-            continue
-
-        if segment.type() == LineType.VERTICAL:
-            start_y = segment.p1.y if segment.p1.y < segment.p2.y else segment.p2.y
-            end_y = segment.p1.y if segment.p1.y > segment.p2.y else segment.p2.y
-            for y in range(start_y, end_y+1):
-                populated_board[segment.p1.x][y]+=1
-            continue
-
-        if segment.type() == LineType.DIAGONAL:
-            populated = False
-            start_x = segment.p1.x if segment.p1.x < segment.p2.x else segment.p2.x
-            end_x = segment.p1.x if segment.p1.x > segment.p2.x else segment.p2.x
-            x_range = range(start_x, end_x+1)
-            start_y = segment.p1.y if segment.p1.x == start_x else segment.p2.y
-            end_y = segment.p1.y if segment.p1.x == end_x else segment.p2.y
-            y_range = range(start_y, end_y+1 if start_y < end_y else end_y-1, 1 if start_y < end_y else -1)
-            for x,y in zip(x_range, y_range):
-                populated = True
-                populated_board[x][y]+=1
-            if not populated:
-                print(segment)
-            continue
-
-        print('oh no this shouldn\'t have happened')
-    
-    return populated_board
+
+SAMPLE_FILE = './sample_input.txt'
+
+# cells rasterized by a single worker in the parallel mode, bounds the memory per stripe
+STRIPE_CELLS = 1 << 22
+
+NON_DIGITS_TO_SPACES = bytes(char if chr(char).isdigit() else ord(' ') for char in range(256))
+
+def test_rasterize_segments():
+    segments = parse_segment_array(SAMPLE_FILE)
+    assert dangerous_points_count(rasterize_segments(segments, include_diagonal=False)) == 5
+    assert dangerous_points_count(rasterize_segments(segments)) == 12
+
+def test_parallel_dangerous_points_count():
+    segments = parse_segment_array(SAMPLE_FILE)
+    assert parallel_dangerous_points_count(segments, include_diagonal=False, stripe_rows=3, processes=2) == 5
+    assert parallel_dangerous_points_count(segments, stripe_rows=1, processes=2) == 12
+
+def test_sparse_dangerous_points_count():
+    segments = parse_segment_array(SAMPLE_FILE)
+    assert sparse_dangerous_points_count(segments, include_diagonal=False) == 5
+    # shifting the segments far away would need a huge dense board, but not a sparse count
+    assert sparse_dangerous_points_count(segments + 3000000) == 12
+
+def parse_segment_array(file_name):
+    '''Parse the line segments into an (n, 4) integer array of x1, y1, x2, y2 rows'''
+    with open(file_name, 'rb') as f:
+        numbers = f.read().translate(NON_DIGITS_TO_SPACES).decode()
+    return np.fromstring(numbers, dtype=np.int64, sep=' ').reshape(-1, 4)
+
+def segment_cells(segments, include_diagonal=True, rows=None):
+    '''Returns (xs, ys) arrays of every cell covered by the segments.
+
+    Cells are generated for all segments at once: each segment is repeated once per cell
+    it covers and stepped from its first point towards its second. If rows is given as
+    (row_start, row_end), segments are clipped to those rows.
+    '''
+    if not include_diagonal:
+        segments = without_diagonals(segments)
+    x1, y1, x2, y2 = segments.T
+    step_x, step_y = np.sign(x2 - x1), np.sign(y2 - y1)
+    lengths = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+    first_steps = np.zeros(len(segments), dtype=np.int64)
+    if rows is not None:
+        row_start, row_end = rows
+        # steps where row_start <= y1 + step_y * step < row_end
+        bound_a, bound_b = (row_start - y1) * step_y, (row_end - 1 - y1) * step_y
+        inside = (step_y != 0) | ((row_start <= y1) & (y1 < row_end))
+        first_steps = np.where(step_y != 0, np.maximum(np.minimum(bound_a, bound_b), 0), 0)
+        last_steps = np.where(step_y != 0, np.minimum(np.maximum(bound_a, bound_b), lengths - 1), lengths - 1)
+        lengths = np.where(inside, np.maximum(last_steps - first_steps + 1, 0), 0)
+
+    cell_segments = np.repeat(np.arange(len(segments)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - first_steps, lengths)
+    xs = x1[cell_segments] + step_x[cell_segments] * steps
+    ys = y1[cell_segments] + step_y[cell_segments] * steps
+    return xs, ys
+
+def without_diagonals(segments):
+    return segments[(segments[:, 0] == segments[:, 2]) | (segments[:, 1] == segments[:, 3])]
+
+def rasterize_segments(segments, include_diagonal=True):
+    '''Returns an integer (max_y+1, max_x+1) board holding the number of segments covering each cell'''
+    shape = (segments[:, [1, 3]].max() + 1, segments[:, [0, 2]].max() + 1)
+    xs, ys = segment_cells(segments, include_diagonal)
+    # counted straight into int32 cells, without an int64 board to copy from
+    board = np.zeros(shape, dtype=np.int32)
+    np.add.at(board, (ys, xs), 1)
+    return board
+
+def sparse_dangerous_points_count(segments, include_diagonal=True):
+    '''Count dangerous points without a dense board.
+
+    Covered cells are encoded as sorted integer keys, and a point is dangerous when its
+    key repeats. Memory scales with the number of covered cells instead of the bounding box.
+    '''
+    xs, ys = segment_cells(segments, include_diagonal)
+    keys = ys * (segments[:, [0, 2]].max() + 1) + xs
+    keys.sort()
+    run_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    run_lengths = np.diff(np.append(run_starts, len(keys)))
+    return int(np.count_nonzero(run_lengths >= 2))
+
+def stripe_dangerous_points_count(stripe):
+    '''Rasterize one horizontal stripe of the board and count its dangerous points'''
+    segments, row_start, row_end, width = stripe
+    xs, ys = segment_cells(segments, rows=(row_start, row_end))
+    return int(np.count_nonzero(np.bincount((ys - row_start) * width + xs) >= 2))
+
+def board_stripes(segments, stripe_rows):
+    '''Yield (segments, row_start, row_end, width) for each stripe, holding only the segments crossing it.
+
+    Segments are sorted once by the stripe of their top row, so the segments starting in
+    a stripe are a slice. Segments still crossing the stripe are carried over from the
+    previous one, which keeps the work per stripe proportional to the segments it holds.
+    '''
+    width = segments[:, [0, 2]].max() + 1
+    height = segments[:, [1, 3]].max() + 1
+    first_stripes = segments[:, [1, 3]].min(axis=1) // stripe_rows
+    last_stripes = segments[:, [1, 3]].max(axis=1) // stripe_rows
+    order = np.argsort(first_stripes, kind='stable')
+    segments, first_stripes, last_stripes = segments[order], first_stripes[order], last_stripes[order]
+    stripes = (height + stripe_rows - 1) // stripe_rows
+    stripe_starts = np.searchsorted(first_stripes, np.arange(stripes + 1))
+    crossing = np.zeros(0, dtype=np.int64)
+    for stripe in range(stripes):
+        crossing = np.concatenate((crossing[last_stripes[crossing] >= stripe], np.arange(stripe_starts[stripe], stripe_starts[stripe + 1])))
+        row_start = stripe * stripe_rows
+        yield segments[crossing], row_start, min(row_start + stripe_rows, height), width
+
+def parallel_dangerous_points_count(segments, include_diagonal=True, stripe_rows=None, processes=None):
+    '''Count dangerous points by rasterizing horizontal stripes of the board in a process pool.
+
+    Every stripe is at most STRIPE_CELLS cells by default, which bounds the memory used by
+    each worker, and the per stripe counts are summed at the end.
+    '''
+    if not include_diagonal:
+        segments = without_diagonals(segments)
+    stripe_rows = stripe_rows or max(1, STRIPE_CELLS // (segments[:, [0, 2]].max() + 1))
+    with Pool(processes=processes or os.cpu_count()) as pool:
+        return sum(pool.imap_unordered(stripe_dangerous_points_count, board_stripes(segments, stripe_rows)))
 
 def dangerous_points_count(board):
     # any point with 2 or more is where 2 or more lines of vents overlap, these are dangerous points
     return np.count_nonzero(board >= 2)
 
 def main(args):
-    if len(args) != 2:
-        print('Need to provide input file.')
+    if len(args) not in [2, 3] or (len(args) == 3 and args[2] not in ['--sparse', '--parallel']):
+        print('Need to provide input file (optionally followed by --sparse or --parallel).')
         return
 
-    line_segments = parse_line_segments(args[1])
+    segments = parse_segment_array(args[1])
+    mode = args[2] if len(args) == 3 else None
+
+    def count_dangerous_points(include_diagonal):
+        if mode == '--sparse':
+            return sparse_dangerous_points_count(segments, include_diagonal)
+        if mode == '--parallel':
+            return parallel_dangerous_points_count(segments, include_diagonal)
+        return dangerous_points_count(rasterize_segments(segments, include_diagonal))
 
     # part one, only populate horizontal and vertical
     print('Part One: Get number of dangerous points where two or more line segments overlap (ignore diagonal)')
-    board = populate_board_with_segments(init_board(line_segments), line_segments, ignore=[LineType.DIAGONAL])
-    print(f'Dangerous point count: {dangerous_points_count(board)}')
+    print(f'Dangerous point count: {count_dangerous_points(include_diagonal=False)}')
 
     # part two, same as part one, but also consider diagonal
     print('Part Two: Same as above, but consider diagonal as well')
-    board = populate_board_with_segments(init_board(line_segments), line_segments)
-    print(f'Dangerous point count: {dangerous_points_count(board)}')
+    print(f'Dangerous point count: {count_dangerous_points(include_diagonal=True)}')
 
-    plt.imshow(board, cmap='hot', interpolation='nearest')
-    plt.show()
+    # headless modes never touch matplotlib
+    if mode is None:
+        import matplotlib.pyplot as plt
+        plt.imshow(rasterize_segments(segments), cmap='hot', interpolation='nearest')
+        plt.show()
 
 if __name__ == '__main__':
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
@@ -1,17 +1,109 @@
 import sys
+from collections import OrderedDict
 
-# note I'm keeping this file, but the cpp file basically replaces it because it is faster
-# and keep up w/ performance reqs
-class LanternFish:
-    def __init__(self, timer):
-        self.timer = int(timer)
-    
-    def __repr__(self):
-        return f'{self.timer}'
+SAMPLE_TIMERS = [3, 4, 3, 1, 2]
+
+def test_simulate_days():
+    assert LanternFishSim(SAMPLE_TIMERS).simulate_days(18) == 26
+    assert LanternFishSim(SAMPLE_TIMERS).simulate_days(80) == 5934
+    assert LanternFishSim(SAMPLE_TIMERS).simulate_days(256) == 26984457539
+
+def test_simulate_days_matches_simulate_day():
+    sim = LanternFishSim(SAMPLE_TIMERS)
+    for _ in range(100):
+        sim.simulate_day()
+    assert LanternFishSim(SAMPLE_TIMERS).simulate_days(100) == sim.fish_count()
+
+def test_population_table():
+    table = population_table([SAMPLE_TIMERS, [8], []], [256, 18, 0, 80], TransitionPowers(max_cached=2))
+    assert table == [[26984457539, 26, 5, 5934], [LanternFishSim([8]).simulate_days(256), 4, 1, LanternFishSim([8]).simulate_days(80)], [0, 0, 0, 0]]
+
+def test_transition_powers_eviction():
+    transition_powers = TransitionPowers(max_cached=3)
+    assert sum(transition_powers.apply(256, LanternFishSim(SAMPLE_TIMERS).timer_counts)) == 26984457539
+    assert len(transition_powers.powers) == 3
+    assert sum(transition_powers.apply(80, LanternFishSim(SAMPLE_TIMERS).timer_counts)) == 5934
+
+# a fish's timer counts down from 8 to 0, then it resets to 6 and spawns a new fish at 8
+TIMER_VALUES = 9
+
+def create_transition_matrix():
+    '''Returns the matrix that maps today's timer counts to tomorrow's'''
+    matrix = [[0] * TIMER_VALUES for _ in range(TIMER_VALUES)]
+    for timer in range(1, TIMER_VALUES):
+        matrix[timer-1][timer] = 1
+    matrix[6][0] = 1
+    matrix[8][0] = 1
+    return matrix
+
+TRANSITION_MATRIX = create_transition_matrix()
+
+def matrix_multiply(a, b):
+    b_cols = list(zip(*b))
+    return [[sum(x * y for x, y in zip(row, col)) for col in b_cols] for row in a]
+
+def matrix_vector_multiply(matrix, vector):
+    return [sum(x * y for x, y in zip(row, vector)) for row in matrix]
+
+def vector_matrix_multiply(vector, matrix):
+    return [sum(x * y for x, y in zip(vector, col)) for col in zip(*matrix)]
+
+class TransitionPowers:
+    '''Cache of the binary powers matrix^(2^k) used to fast-forward populations.
+
+    At most max_cached powers are kept; the least recently used is evicted and
+    recomputed on demand by squaring the closest smaller power. All powers of the same
+    matrix commute, so they can be applied in any order.
+    '''
+    def __init__(self, matrix=TRANSITION_MATRIX, max_cached=32):
+        self.matrix = matrix
+        self.max_cached = max_cached
+        self.powers = OrderedDict()
+
+    def binary_power(self, k):
+        '''Returns matrix^(2^k) (exact int arithmetic)'''
+        if k in self.powers:
+            self.powers.move_to_end(k)
+            return self.powers[k]
+
+        smaller = [j for j in self.powers if j < k]
+        j = max(smaller) if smaller else 0
+        power = self.powers[j] if smaller else self.matrix
+        self.cache(j, power)
+        while j < k:
+            power = matrix_multiply(power, power)
+            j += 1
+            self.cache(j, power)
+        return power
+
+    def cache(self, k, power):
+        self.powers[k] = power
+        self.powers.move_to_end(k)
+        while len(self.powers) > self.max_cached:
+            self.powers.popitem(last=False)
+
+    def apply(self, days, vector):
+        '''Returns matrix^days * vector'''
+        for k in range(days.bit_length()):
+            if days >> k & 1:
+                vector = matrix_vector_multiply(self.binary_power(k), vector)
+        return vector
+
+    def apply_row(self, days, vector):
+        '''Returns vector * matrix^days'''
+        for k in range(days.bit_length()):
+            if days >> k & 1:
+                vector = vector_matrix_multiply(vector, self.binary_power(k))
+        return vector
+
+TRANSITION_POWERS = TransitionPowers()
 
 class LanternFishSim:
+    '''Tracks the lanternfish population as the number of fish with each timer value'''
     def __init__(self, fish_timers: list):
-        self.fishes = [LanternFish(timer) for timer in fish_timers]
+        self.timer_counts = [0] * TIMER_VALUES
+        for timer in fish_timers:
+            self.timer_counts[int(timer)] += 1
         self.days = 0
 
     @staticmethod
@@ -20,23 +112,37 @@ class LanternFishSim:
             # file input should only be one line
             return LanternFishSim(f.readline().split(','))
 
+    def fish_count(self):
+        return sum(self.timer_counts)
+
     def simulate_day(self):
-        fishes_to_add = 0
-        for fish in self.fishes:
-            if fish.timer == 0:
-                fish.timer = 6
-                fishes_to_add += 1
-            else:
-                fish.timer -= 1
-        for i in range(fishes_to_add):
-            self.fishes.append(LanternFish(8))
+        breeding_fish = self.timer_counts[0]
+        self.timer_counts = self.timer_counts[1:] + [breeding_fish]
+        self.timer_counts[6] += breeding_fish
         self.days += 1
-        return self.fishes
+        return self.fish_count()
 
     def simulate_days(self, days):
-        for _ in range(days):
-            self.simulate_day()
-        return self.fishes
+        '''Fast-forward by applying the transition matrix raised to the number of days'''
+        self.timer_counts = TRANSITION_POWERS.apply(days, self.timer_counts)
+        self.days += days
+        return self.fish_count()
+
+def population_table(timer_lists, day_checkpoints, transition_powers=TRANSITION_POWERS):
+    '''Returns table[i][j], the number of fish after day_checkpoints[j] days starting from timer_lists[i].
+
+    The population is linear in the timer counts, so for each checkpoint the number of
+    fish that a single fish with each timer value turns into is computed once (the
+    row vector ones * matrix^days), and every population is a dot product with it.
+    Checkpoints are visited in order, stepping forward by the difference in days.
+    '''
+    timer_counts = [LanternFishSim(fish_timers).timer_counts for fish_timers in timer_lists]
+    fish_per_timer = {}
+    fish_per_timer_at_day, day = [1] * TIMER_VALUES, 0
+    for checkpoint in sorted(set(day_checkpoints)):
+        fish_per_timer_at_day = transition_powers.apply_row(checkpoint - day, fish_per_timer_at_day)
+        fish_per_timer[checkpoint], day = fish_per_timer_at_day, checkpoint
+    return [[sum(x * y for x, y in zip(fish_per_timer[checkpoint], counts)) for checkpoint in day_checkpoints] for counts in timer_counts]
 
 def part_one(file_name):
     sim = LanternFishSim.init_from_file(file_name)
@@ -44,11 +150,11 @@ def part_one(file_name):
 
     # for day in range(1,18):
     #     print(f'After {day} day{"s" if day>1 else ""}: {sim.state(day)}')
-    print(f'Part One: Number of fish after 80 days: {len(sim.simulate_days(80))}')
+    print(f'Part One: Number of fish after 80 days: {sim.simulate_days(80)}')
 
 def part_two(file_name):
     sim = LanternFishSim.init_from_file(file_name)
-    print(f'Part Two: Number of fish after 256 days: {len(sim.simulate_days(256))}')
+    print(f'Part Two: Number of fish after 256 days: {sim.simulate_days(256)}')
                 
 
 def main(args):
@@ -1,6 +1,24 @@
 # https://adventofcode.com/2021/day/7
 
 import sys
+import numpy as np
+
+SAMPLE_POSITIONS = [16, 1, 2, 0, 4, 2, 7, 1, 2, 14]
+
+def test_linear_alignment():
+    assert linear_alignment(SAMPLE_POSITIONS) == (2, 37)
+
+def test_triangular_alignment():
+    assert triangular_alignment(SAMPLE_POSITIONS) == (5, 168)
+
+def test_optimal_alignment():
+    assert optimal_alignment(SAMPLE_POSITIONS, FUEL_COST_MODELS['linear'])[1] == 37
+    assert optimal_alignment(SAMPLE_POSITIONS, FUEL_COST_MODELS['triangular']) == (5, 168)
+
+def test_table_fuel_costs():
+    # a table of 1, 2, 3, ... steps is the triangular cost model
+    assert optimal_alignment(SAMPLE_POSITIONS, table_fuel_costs(range(1, 20))) == (5, 168)
+    assert optimal_alignment(SAMPLE_POSITIONS, table_fuel_costs([1])) == optimal_alignment(SAMPLE_POSITIONS, linear_fuel_costs)
 
 def crab_positions(file_input):
     '''Return horizontal positions of crabs from file input'''
@@ -8,32 +26,90 @@ def crab_positions(file_input):
         return [int(position) for position in f.readline().split(',')]
 
 
-def part_one(file_input):
-    positions = crab_positions(file_input)
+def fuel_cost(steps):
+    '''Fuel needed to move steps (an int or an array) when each step costs 1 more than the last'''
+    return steps * (steps + 1) // 2
 
-    def fuel_cost_to_align_at_position(crab_positions, position):
-        return sum(list(map(lambda crab_position: abs(crab_position-position), crab_positions)))
+def linear_alignment(positions):
+    '''Returns (position, fuel) to align all crabs when each step costs 1 fuel.
 
-    fuel_costs = [fuel_cost_to_align_at_position(positions, position) for position in range(max(positions))]
+    The sum of distances is minimized at the median.
+    '''
+    median = sorted(positions)[len(positions) // 2]
+    return median, sum(abs(position - median) for position in positions)
 
-    print(f'Part One: Minimum fuel cost to align all crabs at a position: {min(fuel_costs)}')
+def triangular_alignment(positions):
+    '''Returns (position, fuel) to align all crabs when each step costs 1 more than the last.
 
-def part_two(file_input):
-    positions = crab_positions(file_input)
+    The total cost is sum((d^2 + |d|) / 2), whose minimum lies within 1/2 of the mean, so
+    only the integers around the mean need to be checked.
+    '''
+    mean = sum(positions) // len(positions)
+    candidates = range(mean - 1, mean + 3)
+    return min(((candidate, sum(fuel_cost(abs(position - candidate)) for position in positions)) for candidate in candidates), key=lambda alignment: alignment[1])
+
+def linear_fuel_costs(steps):
+    return steps
+
+def table_fuel_costs(step_costs):
+    '''Returns a cost model where the n-th step of a move costs step_costs[n-1].
 
-    def fuel_cost(steps):
-        return int(steps*(1+steps)/2) if steps > 0 else steps
+    Step costs must not decrease, which keeps the cost convex. Steps past the end of
+    the table keep costing the last entry.
+    '''
+    step_costs = np.asarray(step_costs, dtype=np.int64)
+    if np.any(np.diff(step_costs) < 0):
+        raise ValueError('step costs must not decrease for the fuel cost to be convex')
+    cumulative_costs = np.concatenate(([0], np.cumsum(step_costs)))
 
-    def fuel_cost_to_align_at_position(crab_positions, position):
-        return sum(list(map(lambda crab_position: fuel_cost(abs(crab_position-position)), crab_positions)))
+    def fuel_costs(steps):
+        table_steps = np.minimum(steps, len(step_costs))
+        return cumulative_costs[table_steps] + (steps - table_steps) * step_costs[-1]
+    return fuel_costs
 
-    fuel_costs = [fuel_cost_to_align_at_position(positions, position) for position in range(max(positions))]
+# fuel cost plug-ins map an array of step counts to the fuel each move costs
+FUEL_COST_MODELS = {
+    'linear': linear_fuel_costs,
+    'triangular': fuel_cost,
+}
 
-    print(f'Part Two: Minimum fuel cost to align all crabs at a position with accurate fuel estimation: {min(fuel_costs)}')
+def optimal_alignment(crab_positions, fuel_costs):
+    '''Returns (position, fuel) minimizing the total fuel for any convex fuel cost plug-in.
+
+    Crabs are grouped by position and each candidate's total cost is evaluated as one
+    array operation. The total is convex, so a binary search for the first position where
+    it stops decreasing finds the optimum.
+    '''
+    positions, counts = np.unique(np.asarray(crab_positions, dtype=np.int64), return_counts=True)
+
+    def total_fuel_cost(candidate):
+        return int(np.dot(fuel_costs(np.abs(positions - candidate)), counts))
+
+    low, high = int(positions[0]), int(positions[-1])
+    while low < high:
+        middle = (low + high) // 2
+        if total_fuel_cost(middle) <= total_fuel_cost(middle + 1):
+            high = middle
+        else:
+            low = middle + 1
+    return low, total_fuel_cost(low)
+
+def part_one(file_input):
+    _, fuel = linear_alignment(crab_positions(file_input))
+    print(f'Part One: Minimum fuel cost to align all crabs at a position: {fuel}')
+
+def part_two(file_input):
+    _, fuel = triangular_alignment(crab_positions(file_input))
+    print(f'Part Two: Minimum fuel cost to align all crabs at a position with accurate fuel estimation: {fuel}')
 
 def main(args):
-    if len(args) != 2:
-        print('Need to provide file input')
+    if len(args) not in [2, 3] or (len(args) == 3 and args[2] not in FUEL_COST_MODELS):
+        print(f'Need to provide file input (optionally followed by a fuel cost model: {", ".join(FUEL_COST_MODELS)})')
+        return
+
+    if len(args) == 3:
+        position, fuel = optimal_alignment(crab_positions(args[1]), FUEL_COST_MODELS[args[2]])
+        print(f'Minimum fuel cost to align all crabs using {args[2]} fuel cost: {fuel} at position {position}')
         return
 
     part_one(args[1])
@@ -1,11 +1,67 @@
 # https://adventofcode.com/2021/day/8
 
+import os
 import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+SAMPLE_FILE = './sample_input.txt'
+
+def test_decode_note():
+    notes = parse_file(SAMPLE_FILE)
+    assert sum(decode_note(note) for note in notes) == 61229
+
+def test_decode_notes_parallel():
+    assert decode_notes_parallel(SAMPLE_FILE, chunk_lines=3, processes=2) == (26, 61229)
+
+def test_calculate_value():
+    note = parse_file(SAMPLE_FILE)[0]
+    assert calculate_value(note, MATCH_CRITERIA) == decode_note(note) == 8394
+
+# Segments lit for each digit on a correctly wired display
+DIGIT_SEGMENTS = ['abcefg', 'cf', 'acdeg', 'acdfg', 'bcdf', 'abdfg', 'abdefg', 'acf', 'abcdefg', 'abcdfg']
+
+# Array of (digit, length, index_of_subset, index_of_superset)
+MATCH_CRITERIA = [
+    (1, 2, None, None),
+    (7, 3, None, None),
+    (4, 4, None, None),
+    (8, 7, None, None),
+    (9, 6, 4, None),
+    (0, 6, 7, None),
+    (6, 6, None, None),
+    (3, 5, 7, None),
+    (5, 5, None, 6),
+    (2, 5, None, None)
+]
+
+def encode_pattern(segments):
+    '''Encode a segment pattern such as 'acf' as a 7 bit integer, one bit per segment'''
+    mask = 0
+    for segment in segments:
+        mask |= 1 << (ord(segment) - ord('a'))
+    return mask
+
+def pattern_signature(mask, masks):
+    '''Multiset of the segments a pattern shares with each of the ten patterns (itself included).
+
+    Rewiring the segments doesn't change how many segments two digits share, so the
+    signature of a digit's pattern is the same on every display.
+    '''
+    return tuple(sorted((mask & other).bit_count() for other in masks))
+
+DIGIT_MASKS = [encode_pattern(segments) for segments in DIGIT_SEGMENTS]
+SIGNATURE_TABLE = {pattern_signature(mask, DIGIT_MASKS): digit for digit, mask in enumerate(DIGIT_MASKS)}
+assert len(SIGNATURE_TABLE) == len(DIGIT_MASKS)
 
 def parse_file(file_name):
     with open(file_name) as f:
-        lines = [line.split('|') for line in f.readlines()]
-        return [(components[0].strip().split(' '), components[1].strip().split(' ')) for components in lines]
+        return [parse_note(line) for line in f.readlines()]
+
+def parse_note(line):
+    components = line.split('|')
+    return (components[0].strip().split(' '), components[1].strip().split(' '))
 
 def count_unique_digits(outputs):
 	return len([segment for output in outputs for segment in output if is_known_digit(segment)])
@@ -14,8 +70,8 @@ def is_known_digit(segments):
     return True if len(segments) in [2,3,4,7] else False
 
 def calculate_value(note, match_criteria):
-	coded_outputs = set(''.join(sorted(output)) for output in note[0])
-	coded_digits = [''.join(sorted(digit)) for digit in note[1]]
+	coded_outputs = set(encode_pattern(output) for output in note[0])
+	coded_digits = [encode_pattern(digit) for digit in note[1]]
 	solution = find_coded_digits(coded_outputs, match_criteria)
 	decoded_values = [solution[code] for code in coded_digits]
 	return int(''.join([str(value) for value in decoded_values]))
@@ -34,17 +90,66 @@ def find_coded_digits(outputs, match_criteria):
 	return solution
 
 def matches(segments, length, subset, superset, digits):
-	if len(segments) != length:
+	if segments.bit_count() != length:
 		return False
 	if subset is not None:
-		return set(segments).issuperset(digits[subset])
+		return segments & digits[subset] == digits[subset]
 	if superset is not None:
-		return set(segments).issubset(digits[superset])
+		return segments & ~digits[superset] == 0
 	return True
 
+def decode_note(note):
+    '''Decode the output value of a note with one signature table lookup per pattern'''
+    masks = [encode_pattern(pattern) for pattern in note[0]]
+    decoded_masks = {mask: SIGNATURE_TABLE[pattern_signature(mask, masks)] for mask in masks}
+    value = 0
+    for digit in note[1]:
+        value = value * 10 + decoded_masks[encode_pattern(digit)]
+    return value
+
+def decode_notes_chunk(lines):
+    '''Returns (part 1 unique digit count, part 2 output value sum) for a chunk of note lines'''
+    notes = [parse_note(line) for line in lines if line.strip()]
+    return count_unique_digits([note[1] for note in notes]), sum(decode_note(note) for note in notes)
+
+def read_note_chunks(file_name, chunk_lines):
+    '''Yield lists of at most chunk_lines lines, streaming through the file'''
+    with open(file_name) as f:
+        while True:
+            lines = list(islice(f, chunk_lines))
+            if not lines:
+                return
+            yield lines
+
+def decode_notes_parallel(file_name, chunk_lines=10000, processes=None):
+    '''Stream chunks of notes to a worker pool and merge the per chunk results.
+
+    At most two chunks per worker are in flight at once, so memory stays flat no
+    matter how large the file is.
+    '''
+    processes = processes or os.cpu_count()
+    unique_digits, total = 0, 0
+    with Pool(processes=processes) as pool:
+        pending = deque()
+        for lines in read_note_chunks(file_name, chunk_lines):
+            pending.append(pool.apply_async(decode_notes_chunk, (lines,)))
+            while len(pending) >= 2 * processes or (pending and pending[0].ready()):
+                chunk_unique_digits, chunk_total = pending.popleft().get()
+                unique_digits, total = unique_digits + chunk_unique_digits, total + chunk_total
+        for result in pending:
+            chunk_unique_digits, chunk_total = result.get()
+            unique_digits, total = unique_digits + chunk_unique_digits, total + chunk_total
+    return unique_digits, total
+
 def main(args):
-    if len(args) != 2:
-        print('Need to provide file input')
+    if len(args) not in [2, 3]:
+        print('Need to provide file input (optionally followed by --parallel)')
+        return
+
+    if args[2:] == ['--parallel']:
+        unique_digits, total = decode_notes_parallel(args[1])
+        print(f"Part 1: {unique_digits}")
+        print(f"Part 2: {total}")
         return
 
     notes = parse_file(args[1])
@@ -52,21 +157,7 @@ def main(args):
     unique_digits = count_unique_digits(outputs)
     print(f"Part 1: {unique_digits}")
 
-    # Array of (digit, length, index_of_subset, index_of_superset)
-    match_criteria = [
-        (1, 2, None, None),
-        (7, 3, None, None),
-        (4, 4, None, None), 
-        (8, 7, None, None),
-        (9, 6, 4, None),
-        (0, 6, 7, None),
-        (6, 6, None, None),
-        (3, 5, 7, None),
-        (5, 5, None, 6),
-        (2, 5, None, None)
-    ]
-
-    total = sum(calculate_value(note, match_criteria) for note in notes)
+    total = sum(decode_note(note) for note in notes)
     print(f"Part 2: {total}")
 
 if __name__ == '__main__':
@@ -1,78 +1,182 @@
 # https://adventofcode.com/2021/day/9
 
+import heapq
 import numpy as np
 import sys
 
+SAMPLE_FILE = './sample_input.txt'
+
+def test_find_low_points():
+    heat_map = generate_heat_map(SAMPLE_FILE)
+    assert find_low_points(heat_map) == [(0, 1), (0, 9), (2, 2), (4, 6)]
+    assert sum(assess_risk_levels(heat_map)) == 15
+    assert sum_risk_levels(heat_map, low_point_mask(heat_map)) == 15
+
+def test_label_basins():
+    heat_map = generate_heat_map(SAMPLE_FILE)
+    labels, basin_sizes = label_basins(heat_map)
+    assert sorted(basin_sizes.tolist()) == [3, 9, 9, 14]
+    assert np.all((labels == -1) == (heat_map == 9))
+
+def test_analyze_heat_map_banded():
+    for band_rows in [1, 2, 3, 5]:
+        risk_level_sum, basin_sizes = analyze_heat_map_banded(SAMPLE_FILE, band_rows, largest=10)
+        assert risk_level_sum == 15
+        assert basin_sizes.tolist() == [14, 9, 9, 3]
+    assert analyze_heat_map_banded(SAMPLE_FILE, 2)[1].tolist() == [14, 9, 9]
+
+def low_point_mask(heat_map):
+    '''Returns a boolean mask of the cells lower than all of their neighbours.
+
+    The heat map is padded with a height above any real one, so every cell is compared
+    with its four neighbours through shifted views of the padded map in one pass.
+    '''
+    padded = np.pad(heat_map, 1, constant_values=10)
+    center = padded[1:-1, 1:-1]
+    return ((center < padded[:-2, 1:-1]) & (center < padded[2:, 1:-1]) &
+            (center < padded[1:-1, :-2]) & (center < padded[1:-1, 2:]))
+
 def find_low_points(heat_map):
-    low_points = []
-    for i in range(len(heat_map)):
-        for j in range(len(heat_map[0])):
-            # Check above element if it exists
-            if i - 1 > -1 and heat_map[i][j] >= heat_map[i-1][j]:
-                continue
-            # Check below element if it exists
-            if i + 1 < len(heat_map) and heat_map[i][j] >= heat_map[i+1][j]:
-                continue
-            # Check left element if it exists
-            if j - 1 > -1 and heat_map[i][j] >= heat_map[i][j-1]:
-                continue
-            # Check right element if it exists
-            if j + 1 < len(heat_map[0]) and heat_map[i][j] >= heat_map[i][j+1]:
-                continue
-            low_points.append((i,j))
-    return low_points
+    return [(int(i), int(j)) for i, j in zip(*np.nonzero(low_point_mask(heat_map)))]
 
 def assess_risk_levels(heat_map):
-    risk_levels = []
-    low_points = find_low_points(heat_map)
-    for i,j in low_points:
-        risk_levels.append(heat_map[i][j]+1)
-    return risk_levels
+    return (heat_map[low_point_mask(heat_map)] + 1).tolist()
+
+def sum_risk_levels(heat_map, low_points):
+    '''Sum of the risk levels (height + 1) of the low points in a boolean mask'''
+    return int(heat_map[low_points].sum()) + int(np.count_nonzero(low_points))
 
 def generate_heat_map(file):
     with open(file) as f:
         return np.array([[int(point) for point in line.strip()] for line in f.readlines()])
 
-def populate_basin(heat_map, point, last_point, basin):
-    i,j = point
-    if last_point:
-        i_last,j_last = last_point
-        if heat_map[i][j] == 9 or heat_map[i][j] <= heat_map[i_last][j_last]:
-            return basin
-
-    basin.add(point)
-    basin_values = []
-    if i-1 >= 0:
-        basin_values = set([*basin_values, *populate_basin(heat_map, (i-1,j), point, basin)])
-    if i+1 <= len(heat_map)-1:
-        basin_values = set([*basin_values, *populate_basin(heat_map, (i+1,j), point, basin)])
-    if j-1 >= 0:
-        basin_values = set([*basin_values, *populate_basin(heat_map, (i,j-1), point, basin)])
-    if j+1 <= len(heat_map[0])-1:
-        basin_values = set([*basin_values, *populate_basin(heat_map, (i,j+1), point, basin)])
-    return basin_values
-
-def find_basins(heat_map):
-    basins = []
-    low_points = find_low_points(heat_map)
-
-    for low_point in low_points:
-        basins.append(populate_basin(heat_map, low_point, None, set()))
-
-    return basins
+def find_root(parents, node):
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+def union(parents, a, b):
+    root_a, root_b = find_root(parents, a), find_root(parents, b)
+    if root_a != root_b:
+        parents[max(root_a, root_b)] = min(root_a, root_b)
+
+def flatten_roots(parents):
+    '''Returns an array with the root of every node, using pointer jumping'''
+    roots = np.array(parents, dtype=np.int64)
+    while np.any(roots[roots] != roots):
+        roots = roots[roots]
+    return roots
+
+def label_basins(heat_map):
+    '''Returns (labels, basin_sizes) where labels holds the basin of every cell (-1 for height 9).
+
+    Every cell that isn't a 9 belongs to exactly one basin. Each row is split into
+    horizontal runs of such cells, runs that touch a run in the next row are joined with
+    union-find, and the basin sizes are the summed lengths of the runs in each basin.
+    '''
+    open_cells = heat_map != 9
+    run_starts = open_cells.copy()
+    run_starts[:, 1:] &= ~open_cells[:, :-1]
+    run_count = int(np.count_nonzero(run_starts))
+    if run_count == 0:
+        return np.full(heat_map.shape, -1), np.zeros(0, dtype=np.int64)
+    run_ids = np.cumsum(run_starts.ravel()).reshape(heat_map.shape) - 1
+    run_lengths = np.bincount(run_ids[open_cells], minlength=run_count)
+
+    touching = open_cells[:-1] & open_cells[1:]
+    edges = np.unique(run_ids[:-1][touching] * run_count + run_ids[1:][touching])
+    parents = list(range(run_count))
+    for upper_run, lower_run in zip((edges // run_count).tolist(), (edges % run_count).tolist()):
+        union(parents, upper_run, lower_run)
+
+    roots = flatten_roots(parents)
+    _, run_basins = np.unique(roots, return_inverse=True)
+    basin_sizes = np.bincount(run_basins, weights=run_lengths).astype(np.int64)
+    labels = np.where(open_cells, run_basins[run_ids], -1)
+    return labels, basin_sizes
+
+def map_heat_map(file):
+    '''Memory-map the heat map file as a (rows, cols) array of digit characters'''
+    with open(file, 'rb') as f:
+        first_line = f.readline()
+    cols = len(first_line.rstrip(b'\r\n'))
+    characters = np.memmap(file, dtype=np.uint8, mode='r')
+    # the last line may be missing its line ending
+    rows = (len(characters) + len(first_line) - cols) // len(first_line)
+    return np.lib.stride_tricks.as_strided(characters, shape=(rows, cols), strides=(len(first_line), 1), writeable=False)
+
+def analyze_heat_map_banded(file, band_rows=1024, largest=3):
+    '''Returns (sum of risk levels, sizes of the largest basins) reading a memory-mapped
+    heat map in bands of rows.
+
+    Low points are found per band, with one extra row above and below for the neighbour
+    comparisons. Basins are labelled per band and stitched to the open basins, those
+    touching the previous band's last row, with a union-find over just those labels.
+    A basin that doesn't reach the band's last row can't grow any further, so its size
+    goes into a running heap of the largest sizes and it is dropped. Memory is bounded by
+    one band of cells plus one row of open basins.
+    '''
+    characters = map_heat_map(file)
+    rows = len(characters)
+    risk_level_sum = 0
+    largest_sizes = []
+    open_sizes = np.zeros(0, dtype=np.int64)
+    open_row_labels = None
+
+    def finalize(sizes):
+        for size in sizes.tolist():
+            if len(largest_sizes) < largest:
+                heapq.heappush(largest_sizes, size)
+            else:
+                heapq.heappushpop(largest_sizes, size)
+
+    for start in range(0, rows, band_rows):
+        end = min(start + band_rows, rows)
+        halo_start = max(start - 1, 0)
+        band = np.asarray(characters[halo_start:min(end + 1, rows)], dtype=np.int8) - ord('0')
+        interior = slice(start - halo_start, end - halo_start)
+        low_points = low_point_mask(band)[interior]
+        heat_map = band[interior]
+        risk_level_sum += sum_risk_levels(heat_map, low_points)
+
+        # union-find nodes are the open basins followed by the basins of this band
+        labels, basin_sizes = label_basins(heat_map)
+        offset = len(open_sizes)
+        parents = list(range(offset + len(basin_sizes)))
+        if open_row_labels is not None:
+            touching = (open_row_labels >= 0) & (labels[0] >= 0)
+            for open_basin, band_basin in set(zip(open_row_labels[touching].tolist(), labels[0][touching].tolist())):
+                union(parents, open_basin, offset + band_basin)
+        roots = flatten_roots(parents)
+        root_sizes = np.bincount(roots, weights=np.concatenate((open_sizes, basin_sizes)), minlength=len(parents)).astype(np.int64)
+
+        last_row = labels[-1] >= 0
+        open_roots = np.unique(roots[offset + labels[-1][last_row]])
+        closed_roots = np.setdiff1d(np.unique(roots), open_roots)
+        finalize(root_sizes[closed_roots])
+        open_sizes = root_sizes[open_roots]
+        open_row_labels = np.full(labels.shape[1], -1)
+        open_row_labels[last_row] = np.searchsorted(open_roots, roots[offset + labels[-1][last_row]])
+
+    finalize(open_sizes)
+    return risk_level_sum, np.array(sorted(largest_sizes, reverse=True), dtype=np.int64)
 
 def main(args):
-    if len(args) != 2:
-        print('Need to provide file input')
+    if len(args) not in [2, 3]:
+        print('Need to provide file input (optionally followed by --banded)')
         return
 
-    heat_map = generate_heat_map(args[1])
-    risk_levels = assess_risk_levels(heat_map)
-    print(f'Part One: Sum of risk levels of low points: {sum(risk_levels)}')
+    if args[2:] == ['--banded']:
+        risk_level_sum, basin_sizes = analyze_heat_map_banded(args[1])
+    else:
+        heat_map = generate_heat_map(args[1])
+        risk_level_sum = sum_risk_levels(heat_map, low_point_mask(heat_map))
+        _, basin_sizes = label_basins(heat_map)
+    print(f'Part One: Sum of risk levels of low points: {risk_level_sum}')
 
-    basins = find_basins(heat_map)
-    # get basin sizes and sort greatest to lowest
-    basin_sizes = sorted([len(basin) for basin in basins], reverse=True)
+    # sort basin sizes greatest to lowest
+    basin_sizes = sorted(basin_sizes.tolist(), reverse=True)
     print(f'Part Two: Three largest basin sizes multiplied together: {basin_sizes[0]*basin_sizes[1]*basin_sizes[2]}')
 
 if __name__ == '__main__':